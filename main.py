@@ -1,10 +1,35 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import threading
+import os
+import logging
+from logging.handlers import RotatingFileHandler
 from datetime import datetime
-from monitor import NetworkMonitor, Connection
+from functools import lru_cache
+from monitor import NetworkMonitor, Connection, snapshot_digest, PENDING_GEO
 from typing import List
 
+TABLE_ROW_HEIGHT = 25
+LOG_PATH = os.path.join(os.path.expanduser("~"), ".cybernetmon", "cybernetmon.log")
+
+def setup_logging():
+    """Send monitor warnings to a rotating log file instead of the console"""
+    try:
+        os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+        handler = RotatingFileHandler(LOG_PATH, maxBytes=1024 * 1024, backupCount=3, encoding='utf-8')
+    except OSError as e:
+        print(f"Logging to console, could not open {LOG_PATH}: {e}")
+        return
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(threadName)s] %(message)s"))
+    logger = logging.getLogger("cybernetmon")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+@lru_cache(maxsize=1024)
+def shorten_process_name(name: str) -> str:
+    """Truncate long process names for the table"""
+    return name[:20] + "..." if len(name) > 20 else name
+
 class CleanStyle:
     """Simplified, professional color scheme with fewer colors"""
     BG_PRIMARY = '#1a1a1a'      
@@ -106,12 +131,20 @@ class CyberNetMonGUI:
         self.root = tk.Tk()
         self.monitor = NetworkMonitor()
         self.connections_data = []
+        self._row_index = {}
+        self._display_cache = {}
+        self._all_rows = []
+        self._view_offset = 0
+        self._visible_rows = 20
+        self._spare_iids = []
+        self._shown_stats = {}
+        self._last_digest = None
         
         self.setup_window()
         self.setup_styles()
         self.create_widgets()
         
-        self.monitor.set_update_callback(self.update_connections_display)
+        self.monitor.set_update_callback(self._on_connections)
         
     def setup_window(self):
         """Configure main window"""
@@ -137,7 +170,7 @@ class CyberNetMonGUI:
             fieldbackground=CleanStyle.BG_CARD,
             borderwidth=0,
             font=('Arial', 9),
-            rowheight=25
+            rowheight=TABLE_ROW_HEIGHT
         )
         
         style.configure(
@@ -306,7 +339,7 @@ class CyberNetMonGUI:
             columns=columns,
             show='headings',
             style="Clean.Treeview",
-            height=20
+            height=self._visible_rows
         )
         
         column_widths = {
@@ -318,15 +351,21 @@ class CyberNetMonGUI:
             self.tree.heading(col, text=name, anchor='w')
             self.tree.column(col, width=column_widths.get(col, 100), anchor='w')
             
-        v_scroll = ttk.Scrollbar(table_container, orient='vertical', command=self.tree.yview, style="Clean.Vertical.TScrollbar")
+        # The tree only holds the rows in view; the scrollbar drives _view_offset instead
+        self.v_scroll = ttk.Scrollbar(table_container, orient='vertical', command=self._on_scrollbar, style="Clean.Vertical.TScrollbar")
         h_scroll = ttk.Scrollbar(table_container, orient='horizontal', command=self.tree.xview)
         
-        self.tree.configure(yscrollcommand=v_scroll.set, xscrollcommand=h_scroll.set)
+        self.tree.configure(xscrollcommand=h_scroll.set)
         
         self.tree.pack(side='left', fill='both', expand=True)
-        v_scroll.pack(side='right', fill='y')
+        self.v_scroll.pack(side='right', fill='y')
         h_scroll.pack(side='bottom', fill='x')
         
+        self.tree.bind('<Configure>', self._on_tree_resize)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', self._on_mousewheel)
+        self.tree.bind('<Button-5>', self._on_mousewheel)
+        
         self.tree.tag_configure('normal', background=CleanStyle.BG_CARD, foreground=CleanStyle.TEXT_PRIMARY)
         self.tree.tag_configure('established', background='#2d4a2d', foreground=CleanStyle.TEXT_PRIMARY)
         self.tree.tag_configure('warning', background='#4a2d2d', foreground=CleanStyle.TEXT_PRIMARY)
@@ -358,19 +397,6 @@ class CyberNetMonGUI:
         )
         self.last_update_label.pack(side='right')
         
-    def assess_threat_level(self, connection):
-        """Simple threat assessment"""
-        if not connection.geo_data:
-            return "normal"
-            
-        suspicious_countries = ['Unknown', 'CN', 'RU']
-        if any(country in connection.geo_data.get('country', '') for country in suspicious_countries):
-            return "warning"
-        elif connection.status == "ESTABLISHED":
-            return "established"
-        else:
-            return "normal"
-            
     def toggle_monitoring(self):
         """Toggle monitoring with visual feedback"""
         if not self.monitor.monitoring:
@@ -400,9 +426,12 @@ class CyberNetMonGUI:
             
     def manual_refresh(self):
         """Manual refresh"""
+        if self.monitor.monitoring:
+            self.monitor.request_refresh()
+            return
+            
         def refresh_worker():
-            connections = self.monitor.get_active_connections()
-            self.root.after(0, lambda: self.update_connections_display(connections))
+            self._on_connections(self.monitor.get_active_connections())
             
         threading.Thread(target=refresh_worker, daemon=True).start()
         self.main_status_label.config(
@@ -410,40 +439,152 @@ class CyberNetMonGUI:
             fg=CleanStyle.STATUS_WARNING
         )
         
-    def update_connections_display(self, connections: List[Connection]):
-        """Update display with connections"""
-        self.connections_data = connections
+    def _on_connections(self, connections: List[Connection]):
+        """Prepare a snapshot off the Tk thread and hand it over for display"""
+        digest = snapshot_digest(connections)
+        if digest == self._last_digest:
+            self.root.after(0, self._update_last_refresh)
+            return
+        self._last_digest = digest
         
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
+        rows = self._collect_rows(connections)
+        stats = self.monitor.get_connection_stats(connections)
+        self.root.after(0, self._apply_rows, connections, rows, stats)
+
+    @staticmethod
+    def _format_location(geo_data) -> str:
+        """Location column text for a connection's geolocation"""
+        if not geo_data:
+            return "Unknown"
+        if geo_data is PENDING_GEO:
+            return "Looking up..."
+        return f"{geo_data.get('city', 'Unknown')}, {geo_data.get('country', 'Unknown')}"
+
+    def _collect_rows(self, connections: List[Connection]):
+        """Format table rows for connections (runs in a worker thread)"""
+        display_cache = {}
+        rows = []
         for conn in connections:
-            threat_level = self.assess_threat_level(conn)
+            key = (conn.pid, conn.local_address, conn.remote_address, conn.protocol)
+            cached = self._display_cache.get(key)
+            if cached and cached[0] == conn.status and cached[1] is conn.geo_data:
+                values, threat_level = cached[2], cached[3]
+            else:
+                # The time column keeps showing when the connection was first seen
+                values = (
+                    cached[2][0] if cached else conn.timestamp.strftime("%H:%M:%S"),
+                    shorten_process_name(conn.process_name),
+                    conn.protocol,
+                    conn.local_address,
+                    conn.remote_address,
+                    conn.status,
+                    self._format_location(conn.geo_data)
+                )
+                threat_level = self.monitor.assess_threat_level(conn)
+            display_cache[key] = (conn.status, conn.geo_data, values, threat_level)
+            rows.append((key, values, threat_level))
             
-            values = (
-                conn.timestamp.strftime("%H:%M:%S"),
-                conn.process_name[:20] + "..." if len(conn.process_name) > 20 else conn.process_name,
-                conn.protocol,
-                conn.local_address,
-                conn.remote_address,
-                conn.status,
-                f"{conn.geo_data.get('city', 'Unknown')}, {conn.geo_data.get('country', 'Unknown')}" if conn.geo_data else "Unknown"
-            )
-            
-            self.tree.insert('', 'end', values=values, tags=(threat_level,))
-            
-        self.update_stats()
-        self.last_update_label.config(
-            text=f"Last update: {datetime.now().strftime('%H:%M:%S')}"
-        )
+        self._display_cache = display_cache
+        return rows
+        
+    def _apply_rows(self, connections: List[Connection], rows, stats):
+        """Update display with prepared rows (runs on the Tk thread)"""
+        self.connections_data = connections
         
-    def update_stats(self):
-        """Update statistics"""
-        stats = self.monitor.get_connection_stats()
+        # Keep rows in first-seen order so the view doesn't shuffle between refreshes
+        rows_by_key = {row[0]: row for row in rows}
+        ordered = [rows_by_key.pop(key) for key, _, _ in self._all_rows if key in rows_by_key]
+        ordered.extend(rows_by_key.values())
+        self._all_rows = ordered
+        self._render_window()
+        
+        # Only touch the stat labels whose value actually changed
         for key, value in stats.items():
-            if key in self.stats_cards:
+            if key in self.stats_cards and self._shown_stats.get(key) != value:
                 self.stats_cards[key].config(text=str(value))
+                self._shown_stats[key] = value
+                
+        self._update_last_refresh()
+        
+    def _update_last_refresh(self):
+        """Show when the connection list was last refreshed"""
+        self.last_update_label.config(
+            text=f"Last update: {datetime.now().strftime('%H:%M:%S')}"
+        )
+                
+    def _render_window(self):
+        """Reconcile the tree with the slice of rows that is currently in view"""
+        total = len(self._all_rows)
+        self._view_offset = max(0, min(self._view_offset, total - self._visible_rows))
+        window = self._all_rows[self._view_offset:self._view_offset + self._visible_rows]
+        
+        # Rows leaving the view are detached in one call and their items recycled
+        window_keys = {key for key, _, _ in window}
+        stale = [self._row_index.pop(key)[0] for key in list(self._row_index) if key not in window_keys]
+        if stale:
+            # Recycled items must not carry selection or focus over to another connection
+            self.tree.selection_remove(*stale)
+            if self.tree.focus() in stale:
+                self.tree.focus('')
+            self.tree.detach(*stale)
+            self._spare_iids.extend(stale)
+            
+        order = []
+        for index, (key, values, threat_level) in enumerate(window):
+            entry = self._row_index.get(key)
+            if entry is None:
+                if self._spare_iids:
+                    iid = self._spare_iids.pop()
+                    self.tree.item(iid, values=values, tags=(threat_level,))
+                    self.tree.reattach(iid, '', index)
+                else:
+                    iid = self.tree.insert('', index, values=values, tags=(threat_level,))
+                self._row_index[key] = (iid, values)
+            else:
+                iid = entry[0]
+                if entry[1] is not values:
+                    self.tree.item(iid, values=values, tags=(threat_level,))
+                    self._row_index[key] = (iid, values)
+            order.append(iid)
+            
+        if tuple(order) != self.tree.get_children():
+            for index, iid in enumerate(order):
+                self.tree.move(iid, '', index)
+                
+        surplus = len(order) + len(self._spare_iids) - self._visible_rows
+        if surplus > 0:
+            self.tree.delete(*self._spare_iids[:surplus])
+            del self._spare_iids[:surplus]
                 
+        if total:
+            self.v_scroll.set(self._view_offset / total, (self._view_offset + len(window)) / total)
+        else:
+            self.v_scroll.set(0, 1)
+            
+    def _on_scrollbar(self, action, amount, unit=None):
+        """Translate scrollbar commands into a new view offset"""
+        if action == 'moveto':
+            self._view_offset = int(float(amount) * len(self._all_rows))
+        elif action == 'scroll':
+            step = self._visible_rows if unit == 'pages' else 1
+            self._view_offset += int(amount) * step
+        self._render_window()
+        
+    def _on_mousewheel(self, event):
+        """Scroll the virtual view by a few rows per wheel notch"""
+        direction = -1 if event.num == 4 or event.delta > 0 else 1
+        self._view_offset += direction * 3
+        self._render_window()
+        return "break"
+        
+    def _on_tree_resize(self, event):
+        """Fit the number of rendered rows to the table height"""
+        # One row's worth of height is taken by the column headings
+        visible_rows = max(1, event.height // TABLE_ROW_HEIGHT - 1)
+        if visible_rows != self._visible_rows:
+            self._visible_rows = visible_rows
+            self._render_window()
+            
     def export_data(self):
         """Export data functionality"""
         if not self.connections_data:
@@ -456,21 +597,35 @@ class CyberNetMonGUI:
             title="Export Connection Data"
         )
         
-        if filename:
+        if not filename:
+            return
+            
+        # Exporting may enumerate and geolocate, so keep it off the Tk thread
+        def export_worker():
             try:
                 exported_file = self.monitor.export_connections(filename)
-                messagebox.showinfo("Export Successful", f"Data exported to:\n{exported_file}")
             except Exception as e:
-                messagebox.showerror("Export Error", f"Failed to export data:\n{str(e)}")
+                self.root.after(0, messagebox.showerror, "Export Error", f"Failed to export data:\n{str(e)}")
+            else:
+                self.root.after(0, messagebox.showinfo, "Export Successful", f"Data exported to:\n{exported_file}")
+                
+        threading.Thread(target=export_worker, daemon=True).start()
                 
     def clear_display(self):
         """Clear display"""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.tree.delete(*self.tree.get_children(), *self._spare_iids)
+        self._spare_iids = []
         self.connections_data = []
+        self._row_index = {}
+        self._display_cache = {}
+        self._all_rows = []
+        self._view_offset = 0
+        self._last_digest = None
+        self.v_scroll.set(0, 1)
         
         for key in self.stats_cards:
             self.stats_cards[key].config(text="0")
+            self._shown_stats[key] = 0
             
         self.main_status_label.config(
             text="Display cleared - Ready for new data",
@@ -484,12 +639,15 @@ class CyberNetMonGUI:
         try:
             self.root.mainloop()
         except KeyboardInterrupt:
-            self.monitor.stop_monitoring()
+            pass
+        finally:
+            self.monitor.close()
             
 if __name__ == "__main__":
     print("CyberNetMon")
     print("=" * 40)
     print("Starting application...")
+    setup_logging()
     
     try:
         app = CyberNetMonGUI()
@@ -1,138 +1,754 @@
 import psutil
 import socket
+import os
+import sqlite3
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import ipaddress
+import json
+import logging
 import threading
 import time
+import functools
+import bisect
+import operator
+import queue
+from collections import OrderedDict
+from string import ascii_uppercase
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional
-
-class Connection:
-    """Data class to represent a network connection"""
-    def __init__(self, conn_info):
-        self.timestamp = datetime.now()
-        self.process_name = self._get_process_name(conn_info.pid)
-        self.pid = conn_info.pid if conn_info.pid else "N/A"
-        self.protocol = "TCP" if conn_info.type == socket.SOCK_STREAM else "UDP"
-        self.local_address = self._format_address(conn_info.laddr)
-        self.remote_address = self._format_address(conn_info.raddr)
-        self.remote_ip = conn_info.raddr.ip if conn_info.raddr else ""
-        self.status = getattr(conn_info, 'status', 'Unknown')
-        self.geo_data = None
-        
-    def _get_process_name(self, pid: Optional[int]) -> str:
-        """Get process name from PID"""
-        if not pid:
-            return "System"
-        try:
-            process = psutil.Process(pid)
-            return process.name()
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            return "Unknown"
+from typing import List, Dict, Optional, Iterable, Tuple, NamedTuple, Union
+
+try:
+    import maxminddb
+except ImportError:
+    maxminddb = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+GEOIP_DIR = os.path.dirname(os.path.abspath(__file__))
+GEOIP_CITY_DB = os.path.join(GEOIP_DIR, "GeoLite2-City.mmdb")
+GEOIP_ASN_DB = os.path.join(GEOIP_DIR, "GeoLite2-ASN.mmdb")
+
+GEO_BATCH_URL = "http://ip-api.com/batch"
+GEO_BATCH_FIELDS = "status,country,countryCode,city,org,isp,query"
+GEO_BATCH_SIZE = 100
+
+HTTP_POOL_CONNECTIONS = 8
+HTTP_POOL_MAXSIZE = 16
+LOOKUP_WORKERS = 8
+ENRICH_WORKERS = 4
+ENRICH_BATCH_SIZE = 50
+PROCESS_VALIDATE_INTERVAL = 30
+LOG_THROTTLE_INTERVAL = 1.0
+
+GEO_CACHE_SIZE = 4096
+GEO_CACHE_TTL = 24 * 60 * 60
+GEO_FAILURE_CACHE_SIZE = 1024
+GEO_FAILURE_TTL = 60
+GEO_DB_PATH = os.path.join(os.path.expanduser("~"), ".cybernetmon", "geo_cache.sqlite")
+
+LOCAL_GEO = {
+    "country": "Local",
+    "city": "Local", 
+    "org": "Local Network",
+    "country_code": "LOCAL",
+    "flag": "🏠"
+}
+
+# Placeholder for remote IPs still waiting on a background lookup
+PENDING_GEO = {
+    "country": "Pending",
+    "city": "Pending",
+    "org": "Pending",
+    "country_code": "PENDING",
+    "flag": "⏳"
+}
+
+class _RateLimitFilter(logging.Filter):
+    """Drop repeats of the same message template within a short interval"""
+    
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self._last_emit: Dict[Tuple[int, str], float] = {}
+        self._lock = threading.Lock()
+        
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_emit.get(key, float("-inf")) < self.interval:
+                return False
+            self._last_emit[key] = now
+        return True
+
+logger = logging.getLogger("cybernetmon")
+logger.addFilter(_RateLimitFilter(LOG_THROTTLE_INTERVAL))
+
+# Regional-indicator flag emoji for every two-letter code
+_FLAG_TABLE = {
+    a + b: chr(0x1F1E6 + ord(a) - ord('A')) + chr(0x1F1E6 + ord(b) - ord('A'))
+    for a in ascii_uppercase for b in ascii_uppercase
+}
+
+# Country codes whose connections are tagged as warnings ("" = unresolved)
+SUSPICIOUS_COUNTRY_CODES = frozenset({'CN', 'RU', ''})
+
+# Cheap string checks that settle the common RFC1918/loopback/link-local cases
+_PRIVATE_PREFIXES = ('10.', '192.168.', '127.', '169.254.', 'fe80:') + tuple(
+    f'172.{octet}.' for octet in range(16, 32)
+)
+
+# Non-public IPv4 blocks as sorted, inclusive integer ranges: everything
+# ipaddress.is_private covers plus carrier-grade NAT (100.64.0.0/10)
+_PRIVATE_V4_RANGES = sorted(
+    (int(net.network_address), int(net.broadcast_address))
+    for net in map(ipaddress.ip_network, (
+        '0.0.0.0/8', '10.0.0.0/8', '100.64.0.0/10', '127.0.0.0/8',
+        '169.254.0.0/16', '172.16.0.0/12', '192.0.0.0/24', '192.0.2.0/24',
+        '192.168.0.0/16', '198.18.0.0/15', '198.51.100.0/24', '203.0.113.0/24',
+        '240.0.0.0/4'
+    ))
+)
+_PRIVATE_V4_STARTS = [start for start, _ in _PRIVATE_V4_RANGES]
+
+# Non-public IPv6 blocks, matching ipaddress is_private/is_loopback/is_link_local
+# except ::ffff:0:0/96, whose addresses are classified by their embedded IPv4
+_PRIVATE_V6_RANGES = sorted(
+    (int(net.network_address), int(net.broadcast_address))
+    for net in map(ipaddress.ip_network, (
+        '::/128', '::1/128', '100::/64', '2001::/23', '2001:db8::/32',
+        'fc00::/7', 'fe80::/10'
+    ))
+)
+_PRIVATE_V6_STARTS = [start for start, _ in _PRIVATE_V6_RANGES]
+
+def _in_ranges(value: int, starts: List[int], ranges: List[Tuple[int, int]]) -> bool:
+    """Check whether value falls inside one of the sorted, disjoint ranges"""
+    index = bisect.bisect_right(starts, value) - 1
+    return index >= 0 and value <= ranges[index][1]
+
+@functools.lru_cache(maxsize=8192)
+def _is_private_ip(ip: str) -> bool:
+    """Check if IP address is private/local (memoized per address string)"""
+    if ip.startswith(_PRIVATE_PREFIXES) or ip == '::1':
+        return True
+    # Dual-stack sockets report IPv4 peers as ::ffff:a.b.c.d
+    if ip.startswith('::ffff:') and '.' in ip:
+        return _is_private_ip(ip[7:])
+    # Unique local IPv6 (fc00::/7) written with a full first group
+    if ip[:2] in ('fc', 'fd') and ip[4:5] == ':':
+        return True
+        
+    try:
+        if ':' in ip:
+            ip_int = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), 'big')
+            if ip_int >> 32 == 0xFFFF:
+                return _in_ranges(ip_int & 0xFFFFFFFF, _PRIVATE_V4_STARTS, _PRIVATE_V4_RANGES)
+            return _in_ranges(ip_int, _PRIVATE_V6_STARTS, _PRIVATE_V6_RANGES)
+        ip_int = int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+    except OSError:
+        return True
+    return _in_ranges(ip_int, _PRIVATE_V4_STARTS, _PRIVATE_V4_RANGES)
+
+class TTLCache:
+    """Size-bounded LRU mapping whose entries expire after a fixed TTL"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        
+    def get(self, key, default=None):
+        """Return a live entry and mark it as recently used"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+            
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+        
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+        
+    def __setitem__(self, key, value):
+        self.set(key, value)
+        
+    def set(self, key, value, ttl: Optional[float] = None):
+        """Store an entry, optionally with a shorter remaining lifetime"""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                
+    def __len__(self) -> int:
+        return len(self._data)
+        
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class GeoStore:
+    """SQLite persistence for successful geolocation lookups"""
+    
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geo ("
+                "ip TEXT PRIMARY KEY, country TEXT, city TEXT, org TEXT, "
+                "country_code TEXT, flag TEXT, ts INTEGER)"
+            )
+            self._db.commit()
+            
+    def load(self, max_age: float, limit: int) -> List[Tuple[str, Dict[str, str], float]]:
+        """Return (ip, geo_data, age) for the newest entries younger than max_age"""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT ip, country, city, org, country_code, flag, ts FROM geo "
+                "WHERE ts > ? ORDER BY ts DESC LIMIT ?",
+                (int(now - max_age), limit)
+            ).fetchall()
+        return [
+            (ip, {"country": country, "city": city, "org": org,
+                  "country_code": country_code, "flag": flag}, now - ts)
+            for ip, country, city, org, country_code, flag, ts in reversed(rows)
+        ]
+        
+    def save_many(self, entries: Dict[str, Dict[str, str]]):
+        """Insert or refresh several lookups in a single transaction"""
+        if not entries:
+            return
+        now = int(time.time())
+        rows = [
+            (ip, geo["country"], geo["city"], geo["org"], geo["country_code"], geo["flag"], now)
+            for ip, geo in entries.items()
+        ]
+        with self._lock:
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO geo (ip, country, city, org, country_code, flag, ts) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("Error saving geolocation cache: %s", e)
+                
+    def prune(self, max_age: float):
+        """Delete entries older than max_age so the file doesn't grow forever"""
+        with self._lock:
+            self._db.execute("DELETE FROM geo WHERE ts <= ?", (int(time.time() - max_age),))
+            self._db.commit()
             
-    def _format_address(self, addr_tuple) -> str:
-        """Format address tuple to string"""
-        if addr_tuple:
-            return f"{addr_tuple.ip}:{addr_tuple.port}"
-        return ""
+    def clear(self):
+        """Delete every stored lookup"""
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM geo")
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("Error clearing geolocation cache: %s", e)
+                
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Connection fields copied verbatim into export records, and their JSON keys
+_EXPORT_ATTRS = operator.attrgetter(
+    'timestamp', 'process_name', 'pid', 'protocol', 'local_address', 'remote_address', 'status'
+)
+_EXPORT_KEYS = ('timestamp', 'process', 'pid', 'protocol', 'local_address', 'remote_address', 'status')
+
+def _dump_record(record: Dict) -> str:
+    """Serialise one export record on a single line"""
+    if orjson is not None:
+        return orjson.dumps(record).decode('utf-8')
+    return json.dumps(record, ensure_ascii=False)
+
+class Connection(NamedTuple):
+    """Immutable record representing a network connection"""
+    timestamp: datetime
+    pid: Union[int, str]
+    process_name: str
+    protocol: str
+    local_address: str
+    remote_address: str
+    remote_ip: str
+    status: str
+    geo_data: Optional[Dict[str, str]]
+    
+    @classmethod
+    def from_psutil(cls, conn_info, process_name: str,
+                    geo_data: Optional[Dict[str, str]] = None,
+                    timestamp: Optional[datetime] = None) -> "Connection":
+        """Build a record from a psutil connection entry, stamped with timestamp or now"""
+        laddr, raddr = conn_info.laddr, conn_info.raddr
+        return cls(
+            timestamp=timestamp or datetime.now(),
+            pid=conn_info.pid if conn_info.pid else "N/A",
+            process_name=process_name,
+            protocol="TCP" if conn_info.type == socket.SOCK_STREAM else "UDP",
+            local_address=f"{laddr.ip}:{laddr.port}" if laddr else "",
+            remote_address=f"{raddr.ip}:{raddr.port}" if raddr else "",
+            remote_ip=raddr.ip if raddr else "",
+            status=conn_info.status,
+            geo_data=geo_data
+        )
+
+def snapshot_digest(connections: List[Connection]) -> int:
+    """Cheap fingerprint of a snapshot used to detect whether anything changed"""
+    return hash(frozenset(
+        (c.pid, c.local_address, c.remote_address, c.status,
+         c.geo_data and c.geo_data.get("country"), c.geo_data and c.geo_data.get("city"))
+        for c in connections
+    ))
 
 class NetworkMonitor:
     """Main network monitoring class"""
     
-    def __init__(self):
-        self.geo_cache: Dict[str, Dict] = {}
+    def __init__(self, include_udp: bool = False, geo_db_path: Optional[str] = GEO_DB_PATH,
+                 geo_cache_size: int = GEO_CACHE_SIZE):
+        # UDP sockets rarely carry a remote address, so only TCP is enumerated by default
+        self.connection_kind = 'inet' if include_udp else 'tcp'
+        # Bounded LRU so busy hosts cannot grow the cache without limit
+        self.geo_cache = TTLCache(geo_cache_size, GEO_CACHE_TTL)
+        self._geo_failures = TTLCache(GEO_FAILURE_CACHE_SIZE, GEO_FAILURE_TTL)
         self.monitoring = False
         self.monitor_thread = None
         self.callback = None
+        # Set by stop_monitoring and request_refresh to cut the current wait short
+        self._wake_event = threading.Event()
+        self.update_interval = 2
+        # Current, possibly backed-off, wait of the monitor loop
+        self._poll_interval = self.update_interval
+        self._snapshot_lock = threading.Lock()
+        self._last_connections: List[Connection] = []
+        self._last_snapshot_ts = 0.0
+        # Serialises callbacks so an enriched snapshot never overtakes a newer one
+        self._emit_lock = threading.Lock()
+        self._enrich_queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._pending_geo = set()
+        self._pending_lock = threading.Lock()
+        self._enrich_threads: List[threading.Thread] = []
+        self._proc_cache: Dict[int, Tuple[float, str]] = {}
+        self._session = self._create_session()
+        self._lookup_pool = ThreadPoolExecutor(
+            max_workers=LOOKUP_WORKERS,
+            thread_name_prefix="lookup"
+        )
+        # Separate from _lookup_pool so process names never queue behind HTTP lookups
+        self._names_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="names")
+        self._geo_reader = self._open_geo_database(GEOIP_CITY_DB)
+        self._asn_reader = self._open_geo_database(GEOIP_ASN_DB)
+        self._geo_store = self._open_geo_store(geo_db_path)
+        
+    def _open_geo_store(self, path: Optional[str]) -> Optional[GeoStore]:
+        """Open the on-disk geolocation cache and warm geo_cache from it"""
+        if not path:
+            return None
+        try:
+            store = GeoStore(path)
+            store.prune(GEO_CACHE_TTL)
+            for ip, geo_data, age in store.load(GEO_CACHE_TTL, self.geo_cache.maxsize):
+                self.geo_cache.set(ip, geo_data, ttl=GEO_CACHE_TTL - age)
+            return store
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Error opening geolocation cache %s: %s", path, e)
+            return None
+            
+    def _remember_geo(self, entries: Dict[str, Dict[str, str]]):
+        """Cache successful lookups in memory and on disk"""
+        for ip, geo_data in entries.items():
+            self.geo_cache[ip] = geo_data
+        if self._geo_store is not None:
+            self._geo_store.save_many(entries)
+            
+    def _create_session(self) -> requests.Session:
+        """Create a keep-alive HTTP session shared by all geolocation lookups"""
+        retry = Retry(
+            total=2,
+            backoff_factor=0.2,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"})
+        )
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_CONNECTIONS,
+            pool_maxsize=HTTP_POOL_MAXSIZE,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
         
+    def _open_geo_database(self, path: str):
+        """Open a local MaxMind database if the reader and file are available"""
+        if maxminddb is None or not os.path.exists(path):
+            return None
+        try:
+            return maxminddb.open_database(path, maxminddb.MODE_MMAP)
+        except (OSError, maxminddb.InvalidDatabaseError) as e:
+            logger.warning("Error opening GeoIP database %s: %s", path, e)
+            return None
+            
     def set_update_callback(self, callback):
         """Set callback function for GUI updates"""
         self.callback = callback
         
+    def get_process_name(self, pid: Optional[int]) -> str:
+        """Get process name from PID, cached while the process is alive"""
+        if not pid:
+            return "System"
+        cached = self._proc_cache.get(pid)
+        if cached:
+            return cached[1]
+        try:
+            process = psutil.Process(pid)
+            name = process.name()
+            self._proc_cache[pid] = (process.create_time(), name)
+            return name
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return "Unknown"
+            
+    def _resolve_process_names(self, pids: Iterable[Optional[int]]) -> Dict[Optional[int], str]:
+        """Resolve the names of several processes at once"""
+        return {pid: self.get_process_name(pid) for pid in pids}
+        
+    def _validate_process_cache(self):
+        """Drop cached names of processes that have exited or whose PID was reused"""
+        for pid, (create_time, _) in list(self._proc_cache.items()):
+            try:
+                if psutil.Process(pid).create_time() == create_time:
+                    continue
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+            self._proc_cache.pop(pid, None)
+            
     def is_private_ip(self, ip: str) -> bool:
         """Check if IP address is private/local"""
-        try:
-            ip_obj = ipaddress.ip_address(ip)
-            return ip_obj.is_private or ip_obj.is_loopback or ip_obj.is_link_local
-        except ValueError:
-            return True
+        return _is_private_ip(ip)
             
     def get_geolocation(self, ip: str) -> Dict[str, str]:
         """Get geolocation data for IP address with caching"""
-        if ip in self.geo_cache:
-            return self.geo_cache[ip]
+        geo_data = self._cached_geo(ip)
+        if geo_data:
+            return geo_data
             
         if self.is_private_ip(ip):
-            geo_data = {
-                "country": "Local",
-                "city": "Local", 
-                "org": "Local Network",
-                "flag": "🏠"
-            }
+            return LOCAL_GEO
+            
+        geo_data = self._lookup_local(ip)
+        if geo_data:
+            self.geo_cache[ip] = geo_data
+            return geo_data
+            
+        return self._fetch_single(ip)
+        
+    def _geo_or_enqueue(self, ip: str) -> Dict[str, str]:
+        """Return geolocation available without the web API, queueing the rest"""
+        geo_data = self._cached_geo(ip)
+        if geo_data:
+            return geo_data
+            
+        if self.is_private_ip(ip):
+            return LOCAL_GEO
+            
+        geo_data = self._lookup_local(ip)
+        if geo_data:
             self.geo_cache[ip] = geo_data
             return geo_data
             
+        with self._pending_lock:
+            if ip not in self._pending_geo:
+                self._pending_geo.add(ip)
+                self._enrich_queue.put(ip)
+        return PENDING_GEO
+        
+    def _start_enrich_workers(self):
+        """Start the background geolocation workers, replacing any that have died"""
+        self._enrich_threads = [thread for thread in self._enrich_threads if thread.is_alive()]
+        for n in range(len(self._enrich_threads), ENRICH_WORKERS):
+            thread = threading.Thread(
+                target=self._geo_worker,
+                name=f"geo-enrich-{n}",
+                daemon=True
+            )
+            thread.start()
+            self._enrich_threads.append(thread)
+            
+    def _geo_worker(self):
+        """Resolve queued IPs in batches and republish the snapshot"""
+        while True:
+            ip = self._enrich_queue.get()
+            if ip is None:
+                return
+                
+            batch = [ip]
+            stop = False
+            while len(batch) < ENRICH_BATCH_SIZE:
+                try:
+                    ip = self._enrich_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if ip is None:
+                    stop = True
+                    break
+                batch.append(ip)
+                
+            try:
+                self.get_geolocations_bulk(batch)
+            except Exception as e:
+                logger.warning("Error resolving queued geolocations: %s", e)
+            finally:
+                with self._pending_lock:
+                    self._pending_geo.difference_update(batch)
+                    
+            if self.monitoring:
+                try:
+                    self._emit_snapshot()
+                except Exception as e:
+                    logger.warning("Error publishing enriched connections: %s", e)
+            if stop:
+                return
+                
+    def _emit_snapshot(self):
+        """Fill in newly resolved geolocation and pass the latest snapshot to the callback"""
+        with self._emit_lock:
+            with self._snapshot_lock:
+                connections = [
+                    conn._replace(geo_data=self._cached_geo(conn.remote_ip) or PENDING_GEO)
+                    if conn.geo_data is PENDING_GEO else conn
+                    for conn in self._last_connections
+                ]
+                self._last_connections = connections
+            if self.callback:
+                self.callback(connections)
+        return connections
+        
+    def _fetch_single(self, ip: str) -> Dict[str, str]:
+        """Look up a single IP through the web API and cache the result"""
         try:
-            response = requests.get(f"https://ipapi.co/{ip}/json/", timeout=3)
+            response = self._session.get(f"https://ipapi.co/{ip}/json/", timeout=3)
             if response.status_code == 200:
                 data = response.json()
                 geo_data = {
                     "country": data.get("country_name", "Unknown"),
                     "city": data.get("city", "Unknown"),
                     "org": data.get("org", "Unknown ISP"),
+                    "country_code": (data.get("country_code") or "").upper(),
                     "flag": self._get_country_flag(data.get("country_code", ""))
                 }
-                self.geo_cache[ip] = geo_data
+                self._remember_geo({ip: geo_data})
                 return geo_data
         except requests.RequestException as e:
-            print(f"Error getting geolocation for {ip}: {e}")
+            logger.warning("Error getting geolocation for %s: %s", ip, e)
+            
+        geo_data = self._unknown_geo()
+        self._geo_failures[ip] = geo_data
+        return geo_data
+        
+    def _cached_geo(self, ip: str) -> Optional[Dict[str, str]]:
+        """Return a cached lookup result, including recent failures"""
+        return self.geo_cache.get(ip) or self._geo_failures.get(ip)
+        
+    def _lookup_local(self, ip: str) -> Optional[Dict[str, str]]:
+        """Look up an IP in the local GeoLite2 databases, if loaded"""
+        if self._geo_reader is None:
+            return None
+        try:
+            record = self._geo_reader.get(ip)
+        except ValueError:
+            return None
+        if not record:
+            return None
             
-        geo_data = {
+        country = record.get("country", {})
+        org = "Unknown ISP"
+        if self._asn_reader is not None:
+            asn = self._asn_reader.get(ip) or {}
+            org = asn.get("autonomous_system_organization", org)
+            
+        return {
+            "country": country.get("names", {}).get("en", "Unknown"),
+            "city": record.get("city", {}).get("names", {}).get("en", "Unknown"),
+            "org": org,
+            "country_code": country.get("iso_code", ""),
+            "flag": self._get_country_flag(country.get("iso_code", ""))
+        }
+        
+    def _unknown_geo(self) -> Dict[str, str]:
+        """Placeholder geolocation for IPs that could not be resolved"""
+        return {
             "country": "Unknown", 
             "city": "Unknown", 
             "org": "Unknown ISP",
+            "country_code": "",
             "flag": "❓"
         }
-        self.geo_cache[ip] = geo_data
-        return geo_data
+        
+    def get_geolocations_bulk(self, ips: Iterable[str]):
+        """Resolve geolocation for many IPs with batched lookups into the cache"""
+        missing = []
+        for ip in set(ips):
+            if self._cached_geo(ip) or self.is_private_ip(ip):
+                continue
+            geo_data = self._lookup_local(ip)
+            if geo_data:
+                self.geo_cache[ip] = geo_data
+            else:
+                missing.append(ip)
+        
+        # Batches run concurrently; whatever they could not answer is then
+        # looked up one IP at a time, also fanned out over the pool
+        chunks = [missing[i:i + GEO_BATCH_SIZE] for i in range(0, len(missing), GEO_BATCH_SIZE)]
+        unresolved = []
+        for chunk_unresolved in self._lookup_pool.map(self._batch_geolocate, chunks):
+            unresolved.extend(chunk_unresolved)
+        if unresolved:
+            list(self._lookup_pool.map(self._fetch_single, unresolved))
+            
+    def _batch_geolocate(self, ips: List[str]) -> List[str]:
+        """Resolve up to GEO_BATCH_SIZE IPs in one request, returning the ones left unanswered"""
+        try:
+            response = self._session.post(
+                GEO_BATCH_URL,
+                params={"fields": GEO_BATCH_FIELDS},
+                json=ips,
+                timeout=5
+            )
+            response.raise_for_status()
+            results = response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.warning("Batch geolocation failed, falling back to single lookups: %s", e)
+            return ips
+            
+        if not isinstance(results, list):
+            logger.warning("Batch geolocation returned an unexpected response, falling back to single lookups")
+            return ips
+            
+        resolved = {}
+        answered = set()
+        for data in results:
+            if not isinstance(data, dict) or not data.get("query"):
+                continue
+            answered.add(data["query"])
+            if data.get("status") != "success":
+                self._geo_failures[data["query"]] = self._unknown_geo()
+                continue
+            resolved[data["query"]] = {
+                "country": data.get("country") or "Unknown",
+                "city": data.get("city") or "Unknown",
+                "org": data.get("org") or data.get("isp") or "Unknown ISP",
+                "country_code": (data.get("countryCode") or "").upper(),
+                "flag": self._get_country_flag(data.get("countryCode", ""))
+            }
+        self._remember_geo(resolved)
+        return [ip for ip in ips if ip not in answered]
         
     def _get_country_flag(self, country_code: str) -> str:
         """Convert country code to flag emoji"""
-        if not country_code or len(country_code) != 2:
+        if not country_code:
             return "🌍"
+        return _FLAG_TABLE.get(country_code.upper(), "🌍")
         
-        flag = ""
-        for char in country_code.upper():
-            flag += chr(ord(char) - ord('A') + ord('🇦'))
-        return flag
+    def assess_threat_level(self, connection: Connection) -> str:
+        """Simple threat assessment used to tag connections"""
+        if not connection.geo_data:
+            return "normal"
+            
+        if connection.geo_data.get('country_code', '') in SUSPICIOUS_COUNTRY_CODES:
+            return "warning"
+        elif connection.status == "ESTABLISHED":
+            return "established"
+        else:
+            return "normal"
+            
+    def get_active_connections(self, resolve_geo: bool = True) -> List[Connection]:
+        """Get all active network connections
         
-    def get_active_connections(self) -> List[Connection]:
-        """Get all active network connections"""
+        With resolve_geo=False, IPs missing from the caches get PENDING_GEO and
+        are resolved by the background workers instead of blocking the poll.
+        """
         connections = []
         try:
-            for conn in psutil.net_connections(kind='inet'):
-
-                if conn.raddr and not self.is_private_ip(conn.raddr.ip):
-                    connection = Connection(conn)
-                    connection.geo_data = self.get_geolocation(connection.remote_ip)
-                    connections.append(connection)
+            is_private = _is_private_ip
+            remote = [
+                conn for conn in psutil.net_connections(kind=self.connection_kind)
+                if conn.raddr and not is_private(conn.raddr.ip)
+            ]
+            # Every record from one poll shares the same as-of time
+            now = datetime.now()
+            
+            # Resolve process names on their own thread while geolocation runs here
+            names_future = self._names_pool.submit(
+                self._resolve_process_names, {conn.pid for conn in remote}
+            )
+            remote_ips = {conn.raddr.ip for conn in remote}
+            if resolve_geo:
+                self.get_geolocations_bulk(remote_ips)
+                geo_for = self.get_geolocation
+            else:
+                geo_for = self._geo_or_enqueue
+            # Look each peer up once and share the result across its sockets
+            geo_by_ip = {ip: geo_for(ip) for ip in remote_ips}
+            process_names = names_future.result()
+            
+            connections = [
+                Connection.from_psutil(
+                    conn,
+                    process_names[conn.pid],
+                    geo_by_ip[conn.raddr.ip],
+                    now
+                )
+                for conn in remote
+            ]
+                
+            with self._snapshot_lock:
+                self._last_connections = connections
+                self._last_snapshot_ts = time.monotonic()
                     
         except psutil.AccessDenied:
-            print("Access denied. Run as administrator for full functionality.")
+            logger.warning("Access denied. Run as administrator for full functionality.")
         except Exception as e:
-            print(f"Error getting connections: {e}")
+            logger.warning("Error getting connections: %s", e)
             
         return connections
         
-    def start_monitoring(self, update_interval: int = 2):
-        """Start continuous monitoring"""
+    def start_monitoring(self, update_interval: int = 2, max_interval: int = 30):
+        """Start continuous monitoring, backing off to max_interval while idle"""
         if self.monitoring:
             return
             
         self.monitoring = True
+        self.update_interval = update_interval
+        self._poll_interval = update_interval
+        self._wake_event.clear()
+        self._start_enrich_workers()
         self.monitor_thread = threading.Thread(
             target=self._monitor_loop, 
-            args=(update_interval,), 
+            args=(update_interval, max_interval), 
             daemon=True
         )
         self.monitor_thread.start()
@@ -140,64 +756,154 @@ class NetworkMonitor:
     def stop_monitoring(self):
         """Stop continuous monitoring"""
         self.monitoring = False
+        self._wake_event.set()
         if self.monitor_thread:
             self.monitor_thread.join(timeout=1)
             
-    def _monitor_loop(self, update_interval: int):
+    def request_refresh(self):
+        """Ask the monitor loop to poll now and return to the fastest interval"""
+        self._wake_event.set()
+        
+    def _monitor_loop(self, update_interval: int, max_interval: int):
         """Main monitoring loop"""
+        interval = update_interval
+        last_digest = None
+        next_validation = time.monotonic() + PROCESS_VALIDATE_INTERVAL
         while self.monitoring:
             try:
-                connections = self.get_active_connections()
-                if self.callback:
-                    self.callback(connections)
-                time.sleep(update_interval)
+                # Nobody consumes the snapshot, so skip enumeration until a callback is bound
+                if self.callback is None:
+                    if self._wake_event.wait(update_interval):
+                        self._wake_event.clear()
+                    continue
+                    
+                if time.monotonic() >= next_validation:
+                    self._validate_process_cache()
+                    next_validation = time.monotonic() + PROCESS_VALIDATE_INTERVAL
+                    
+                # Geolocation misses are filled in later by the enrich workers
+                self._start_enrich_workers()
+                self.get_active_connections(resolve_geo=False)
+                connections = self._emit_snapshot()
+                
+                digest = snapshot_digest(connections)
+                if digest == last_digest:
+                    interval = min(interval * 2, max_interval)
+                else:
+                    interval = update_interval
+                    last_digest = digest
+                    
+                self._poll_interval = interval
+                if self._wake_event.wait(interval):
+                    self._wake_event.clear()
+                    interval = update_interval
             except Exception as e:
-                print(f"Error in monitoring loop: {e}")
-                time.sleep(1)
+                logger.warning("Error in monitoring loop: %s", e)
+                self._wake_event.wait(1)
                 
-    def get_connection_stats(self) -> Dict[str, int]:
+    def _recent_connections(self) -> List[Connection]:
+        """Reuse the latest snapshot while it is fresh, otherwise take a new one"""
+        max_age = self._poll_interval if self.monitoring else self.update_interval
+        with self._snapshot_lock:
+            fresh = time.monotonic() - self._last_snapshot_ts < max_age
+            connections = self._last_connections
+        if fresh:
+            return self._resolve_pending(connections)
+        return self.get_active_connections()
+        
+    def _resolve_pending(self, connections: List[Connection]) -> List[Connection]:
+        """Replace PENDING_GEO placeholders with looked-up geolocation"""
+        pending = {conn.remote_ip for conn in connections if conn.geo_data is PENDING_GEO}
+        if not pending:
+            return connections
+        self.get_geolocations_bulk(pending)
+        return [
+            conn._replace(geo_data=self.get_geolocation(conn.remote_ip))
+            if conn.geo_data is PENDING_GEO else conn
+            for conn in connections
+        ]
+        
+    def get_connection_stats(self, connections: Optional[List[Connection]] = None) -> Dict[str, int]:
         """Get statistics about current connections"""
-        connections = self.get_active_connections()
+        if connections is None:
+            connections = self._recent_connections()
         
+        tcp = established = 0
+        ips = set()
+        countries = set()
+        for c in connections:
+            if c.protocol == "TCP":
+                tcp += 1
+            if c.status == "ESTABLISHED":
+                established += 1
+            ips.add(c.remote_ip)
+            geo_data = c.geo_data
+            if geo_data and geo_data is not PENDING_GEO:
+                countries.add(geo_data["country"])
+                
         stats = {
             "total": len(connections),
-            "tcp": sum(1 for c in connections if c.protocol == "TCP"),
-            "udp": sum(1 for c in connections if c.protocol == "UDP"),
-            "established": sum(1 for c in connections if c.status == "ESTABLISHED"),
-            "unique_ips": len(set(c.remote_ip for c in connections)),
-            "unique_countries": len(set(c.geo_data["country"] for c in connections if c.geo_data))
+            "tcp": tcp,
+            "udp": len(connections) - tcp,
+            "established": established,
+            "unique_ips": len(ips),
+            "unique_countries": len(countries)
         }
         
         return stats
         
+    def close(self):
+        """Stop monitoring and release the lookup pool, HTTP session and geolocation databases"""
+        self.stop_monitoring()
+        # Let the enrich workers finish their current batch before the pool goes away
+        for _ in self._enrich_threads:
+            self._enrich_queue.put(None)
+        for thread in self._enrich_threads:
+            thread.join(timeout=5)
+        self._enrich_threads = []
+        self._lookup_pool.shutdown(wait=True)
+        self._names_pool.shutdown(wait=True)
+        self._session.close()
+        if self._geo_store is not None:
+            self._geo_store.close()
+            self._geo_store = None
+        for reader in (self._geo_reader, self._asn_reader):
+            if reader is not None:
+                reader.close()
+        self._geo_reader = self._asn_reader = None
+        
     def clear_cache(self):
         """Clear the geolocation cache"""
         self.geo_cache.clear()
+        self._geo_failures.clear()
+        if self._geo_store is not None:
+            self._geo_store.clear()
+        
+    @staticmethod
+    def _export_record(conn: Connection) -> Dict[str, Union[int, str]]:
+        """JSON-ready representation of a single connection"""
+        timestamp, *fields = _EXPORT_ATTRS(conn)
+        record = dict(zip(_EXPORT_KEYS, (timestamp.isoformat(), *fields)))
+        geo_data = conn.geo_data
+        if geo_data and geo_data is not PENDING_GEO:
+            record["country"] = geo_data["country"]
+            record["city"] = geo_data["city"]
+            record["isp"] = geo_data["org"]
+        else:
+            record["country"] = record["city"] = record["isp"] = "Unknown"
+        return record
         
     def export_connections(self, filename: str = None) -> str:
         """Export current connections to JSON format"""
         if not filename:
             filename = f"connections_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
             
-        connections = self.get_active_connections()
-        data = []
-        
-        for conn in connections:
-            data.append({
-                "timestamp": conn.timestamp.isoformat(),
-                "process": conn.process_name,
-                "pid": conn.pid,
-                "protocol": conn.protocol,
-                "local_address": conn.local_address,
-                "remote_address": conn.remote_address,
-                "status": conn.status,
-                "country": conn.geo_data["country"] if conn.geo_data else "Unknown",
-                "city": conn.geo_data["city"] if conn.geo_data else "Unknown",
-                "isp": conn.geo_data["org"] if conn.geo_data else "Unknown"
-            })
-            
-        import json
+        connections = self._recent_connections()
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.write("[")
+            for i, conn in enumerate(connections):
+                f.write(",\n" if i else "\n")
+                f.write(_dump_record(self._export_record(conn)))
+            f.write("\n]\n" if connections else "]\n")
             
         return filename
\ No newline at end of file